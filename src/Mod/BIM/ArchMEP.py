@@ -39,9 +39,22 @@ import ArchPipe
 import ArchEquipment
 import ArchIFC
 import math
+import numpy as np
 
 from draftutils import params
 
+try:
+    from numba import njit, prange
+    _HAVE_NUMBA = True
+except ImportError:
+    # numba is optional, without it the kernels below run as plain Python
+    _HAVE_NUMBA = False
+    prange = range
+    def njit(*args, **kwargs):
+        def decorator(func):
+            return func
+        return decorator
+
 if FreeCAD.GuiUp:
     from PySide.QtCore import QT_TRANSLATE_NOOP
     import FreeCADGui
@@ -55,6 +68,352 @@ else:
     # \endcond
 
 
+# Properties added by the MEP objects, as (name, type, group, tooltip, default,
+# editor mode) records. A list default is an enumeration whose first item is
+# selected. None leaves the default value or the editor mode unchanged.
+_WATERPIPE_PROPS = (
+    # Hydraulic Properties
+    ("FlowRate", "App::PropertyFloat", "MEP Hydraulics",
+     QT_TRANSLATE_NOOP("App::Property","Flow rate in liters/minute"), 0.0, None),
+    ("Pressure", "App::PropertyFloat", "MEP Hydraulics",
+     QT_TRANSLATE_NOOP("App::Property","Pressure in bar"), 2.5, None),  # Default water pressure
+    ("PressureLoss", "App::PropertyFloat", "MEP Hydraulics",
+     QT_TRANSLATE_NOOP("App::Property","Calculated pressure loss in bar"), None, 1),  # Read-only
+    ("Velocity", "App::PropertyFloat", "MEP Hydraulics",
+     QT_TRANSLATE_NOOP("App::Property","Water velocity in m/s"), None, 1),  # Read-only
+    # MEP Classification
+    ("SystemType", "App::PropertyEnumeration", "MEP System",
+     QT_TRANSLATE_NOOP("App::Property","Type of water system"),
+     ["Cold Water Supply", "Hot Water Supply", "Waste Water", "Rain Water", "Gas"], None),
+    ("PipeMaterial", "App::PropertyEnumeration", "MEP System",
+     QT_TRANSLATE_NOOP("App::Property","Pipe material specification"),
+     ["Copper", "PVC", "PEX", "Steel", "Cast Iron", "HDPE"], None),
+    ("RoughnessCoeff", "App::PropertyFloat", "MEP System",
+     QT_TRANSLATE_NOOP("App::Property","Pipe roughness coefficient"), 0.0015, None),  # Default for copper
+    ("InsulationThickness", "App::PropertyLength", "MEP System",
+     QT_TRANSLATE_NOOP("App::Property","Insulation thickness"), None, None),
+    # MEP Connections
+    ("ConnectedFixtures", "App::PropertyLinkList", "MEP Connections",
+     QT_TRANSLATE_NOOP("App::Property","Connected sanitary fixtures"), None, None),
+    ("ConnectedValves", "App::PropertyLinkList", "MEP Connections",
+     QT_TRANSLATE_NOOP("App::Property","Connected valves and fittings"), None, None),
+)
+
+_FIXTURE_PROPS = (
+    # Fixture Classification
+    ("FixtureType", "App::PropertyEnumeration", "Fixture",
+     QT_TRANSLATE_NOOP("App::Property","Type of sanitary fixture"),
+     ["Sink", "Wash Hand Basin", "Toilet Pan", "Urinal", "Bath", "Shower", "Bidet"], None),
+    ("FixtureUnits", "App::PropertyFloat", "Fixture",
+     QT_TRANSLATE_NOOP("App::Property","Fixture units for load calculation"), 1.0, None),
+    ("FlowRate", "App::PropertyFloat", "Fixture",
+     QT_TRANSLATE_NOOP("App::Property","Required flow rate in L/min"), 6.0, None),  # Standard sink flow rate
+    # Water Connections
+    ("ColdWaterConnection", "App::PropertyLink", "Connections",
+     QT_TRANSLATE_NOOP("App::Property","Cold water supply connection"), None, None),
+    ("HotWaterConnection", "App::PropertyLink", "Connections",
+     QT_TRANSLATE_NOOP("App::Property","Hot water supply connection"), None, None),
+    ("DrainConnection", "App::PropertyLink", "Connections",
+     QT_TRANSLATE_NOOP("App::Property","Drain water connection"), None, None),
+    # Installation Properties
+    ("WallMounted", "App::PropertyBool", "Installation",
+     QT_TRANSLATE_NOOP("App::Property","Whether fixture is wall mounted"), True, None),
+    ("InstallationHeight", "App::PropertyLength", "Installation",
+     QT_TRANSLATE_NOOP("App::Property","Installation height from floor"), 850, None),  # Standard height in mm
+)
+
+_VALVE_PROPS = (
+    # Valve Classification
+    ("ValveType", "App::PropertyEnumeration", "Valve",
+     QT_TRANSLATE_NOOP("App::Property","Type of valve"),
+     ["Faucet", "Stop Cock", "Check Valve", "Pressure Relief", "Mixing Valve", "Gas Tap", "Isolating"], None),
+    ("NominalDiameter", "App::PropertyLength", "Valve",
+     QT_TRANSLATE_NOOP("App::Property","Nominal diameter of valve"), 15, None),  # 15mm standard
+    ("WorkingPressure", "App::PropertyFloat", "Valve",
+     QT_TRANSLATE_NOOP("App::Property","Maximum working pressure in bar"), 10.0, None),
+    ("FlowCoefficient", "App::PropertyFloat", "Valve",
+     QT_TRANSLATE_NOOP("App::Property","Valve flow coefficient (Kv)"), 1.0, None),
+    # Control Properties
+    ("IsMotorized", "App::PropertyBool", "Control",
+     QT_TRANSLATE_NOOP("App::Property","Whether valve is motorized"), False, None),
+    ("ControlSignal", "App::PropertyEnumeration", "Control",
+     QT_TRANSLATE_NOOP("App::Property","Control signal type"),
+     ["Manual", "24V DC", "230V AC", "0-10V", "4-20mA"], None),
+    # Connection Properties
+    ("InletConnection", "App::PropertyLink", "Connections",
+     QT_TRANSLATE_NOOP("App::Property","Inlet pipe connection"), None, None),
+    ("OutletConnection", "App::PropertyLink", "Connections",
+     QT_TRANSLATE_NOOP("App::Property","Outlet pipe connection"), None, None),
+)
+
+
+def _add_properties(obj, properties):
+    """Adds the given property records to obj, skipping existing ones"""
+    pl = frozenset(obj.PropertiesList)
+    for name, typ, group, doc, default, mode in properties:
+        if name not in pl:
+            obj.addProperty(typ, name, group, doc, locked=True)
+            if isinstance(default, list):
+                setattr(obj, name, default)
+                setattr(obj, name, default[0])
+            elif default is not None:
+                setattr(obj, name, default)
+            if mode is not None:
+                obj.setEditorMode(name, mode)
+
+
+def _set_if_diff(obj, name, value):
+    """Sets a property only if its value changes, to avoid triggering
+    onChanged and recomputes for nothing"""
+    current = getattr(obj, name)
+    if getattr(current, "Value", current) != value:
+        setattr(obj, name, value)
+
+
+# Roughness coefficient of each pipe material
+_PIPE_ROUGHNESS = {
+    "Copper": 0.0015,
+    "PVC": 0.0001,
+    "PEX": 0.0001,
+    "Steel": 0.045,
+    "Cast Iron": 0.25,
+    "HDPE": 0.0001
+}
+
+# Properties of a water pipe that trigger a hydraulic recalculation
+_HYDRAULIC_TRIGGERS = frozenset({"FlowRate", "Diameter", "Length", "PipeMaterial", "RoughnessCoeff"})
+
+# Display color of each water system type
+_SYSTEM_COLORS = {
+    "Cold Water Supply": (0.0, 0.0, 1.0),    # Blue
+    "Hot Water Supply": (1.0, 0.0, 0.0),     # Red
+    "Waste Water": (0.5, 0.3, 0.1),          # Brown
+    "Rain Water": (0.0, 1.0, 1.0),           # Cyan
+    "Gas": (1.0, 1.0, 0.0)                   # Yellow
+}
+_DEFAULT_COLOR = (0.7, 0.7, 0.7)  # Default gray
+
+# Default flow rate, fixture units and installation height of each fixture type
+_FIXTURE_DEFAULTS = {
+    "Sink": {"FlowRate": 6.0, "FixtureUnits": 1.5, "InstallationHeight": 850},
+    "Wash Hand Basin": {"FlowRate": 4.0, "FixtureUnits": 1.0, "InstallationHeight": 800},
+    "Toilet Pan": {"FlowRate": 0.0, "FixtureUnits": 4.0, "InstallationHeight": 400},
+    "Urinal": {"FlowRate": 0.0, "FixtureUnits": 2.0, "InstallationHeight": 600},
+    "Bath": {"FlowRate": 12.0, "FixtureUnits": 3.0, "InstallationHeight": 0},
+    "Shower": {"FlowRate": 9.0, "FixtureUnits": 2.0, "InstallationHeight": 2100},
+    "Bidet": {"FlowRate": 4.0, "FixtureUnits": 1.0, "InstallationHeight": 400}
+}
+
+
+@njit(cache=True, fastmath=True)
+def _colebrook_kernel(flow_lpm, d_mm, L_mm, rough):
+    """Returns (velocity in m/s, pressure loss in bar) of a water pipe,
+    using the Darcy-Weisbach equation. Diameter must be non-zero."""
+
+    # Local names for the math functions called in the friction factor, and
+    # reciprocals of the unit conversions to multiply instead of divide
+    _log = math.log
+    _exp = math.exp
+    inv_60000 = 1.0 / 60000.0
+    inv_1000 = 1.0 / 1000.0
+    inv_visc = 1.0 / 1.004e-6  # Kinematic viscosity of water at 20°C
+    inv_1e5 = 1.0e-5
+
+    # Convert units
+    flow_m3s = flow_lpm * inv_60000  # L/min to m³/s
+    diameter_m = d_mm * inv_1000  # mm to m
+    length_m = L_mm * inv_1000  # mm to m
+
+    # Calculate cross-sectional area
+    area = math.pi * 0.25 * diameter_m * diameter_m
+
+    # Calculate velocity
+    velocity = flow_m3s / area if area > 0 else 0.0
+
+    # Calculate pressure loss using Darcy-Weisbach equation
+    # ΔP = f * (L/D) * (ρ * v²) / 2
+    reynolds = velocity * diameter_m * inv_visc
+
+    if reynolds > 0:
+        # Explicit solution of the Colebrook-White equation for the friction
+        # factor, 1/√f = -2·log10(k/3.7D + 2.51/(Re·√f)), written with the
+        # Wright ω function (Biberg 2017) and refined with one Fritsch step,
+        # which matches the iterative solution to ~1e-6 using logarithms only
+        a = 0.8685889638065035  # 2 / ln(10)
+        b = rough / (3.7 * diameter_m)
+        ac = a * 2.51 / reynolds
+        log_ac = _log(ac)
+        z = b / ac - log_ac
+        if z > 1.0:
+            w = z - _log(z)
+        elif z > -2.0:
+            w = 1.0 + 0.5 * (z - 1.0) + (z - 1.0) * (z - 1.0) * 0.0625
+        else:
+            w = _exp(z)
+        r = z - w - _log(w)
+        q = 2.0 * (1.0 + w) * (1.0 + w + 2.0 / 3.0 * r)
+        w = w * (1.0 + r / (1.0 + w) * (q - r) / (q - 2.0 * r))
+        x = -a * (log_ac + _log(w))  # 1/√f
+        friction_factor = 1.0 / (x * x)
+
+        # Pressure loss in Pascal, converted to bar
+        pressure_loss_pa = friction_factor * (length_m / diameter_m) * 500.0 * velocity * velocity
+        return velocity, pressure_loss_pa * inv_1e5  # Pa to bar
+    return velocity, 0.0
+
+
+@njit(parallel=True, cache=True, fastmath=True)
+def _colebrook_batch(flow, d, L, rough, v_out, dp_out):
+    """Runs _colebrook_kernel over arrays of pipes in parallel, writing the
+    velocities and pressure losses to v_out and dp_out. Pipes with a zero
+    flow rate or diameter get zeros. Only used when numba is available."""
+
+    for i in prange(flow.shape[0]):
+        if flow[i] != 0 and d[i] != 0:
+            v_out[i], dp_out[i] = _colebrook_kernel(flow[i], d[i], L[i], rough[i])
+        else:
+            v_out[i] = 0.0
+            dp_out[i] = 0.0
+
+
+def _batch_hydraulics(flow_lpm, d_mm, L_mm, rough):
+    """Vectorized counterpart of _colebrook_kernel.
+
+    Takes arrays of flow rates (L/min), diameters (mm), lengths (mm) and
+    roughness coefficients, and returns a (valid, velocity, pressure_loss)
+    tuple of arrays, velocity in m/s and pressure loss in bar. Entries where
+    valid is False have a zero flow rate or diameter and must be left as is,
+    like the scalar version does."""
+
+    flow_lpm = np.asarray(flow_lpm, dtype=float)
+    d_mm = np.asarray(d_mm, dtype=float)
+    L_mm = np.asarray(L_mm, dtype=float)
+    rough = np.asarray(rough, dtype=float)
+    valid = (flow_lpm != 0) & (d_mm != 0)
+
+    with np.errstate(all="ignore"):
+        flow = flow_lpm / 60000.0  # L/min to m³/s
+        d = d_mm / 1000.0  # mm to m
+        area = np.pi * (d * 0.5) ** 2
+        v = np.where(area > 0, flow / area, 0.0)
+        Re = v * d / 1.004e-6  # Kinematic viscosity of water at 20°C
+        # Explicit Colebrook-White friction factor, see _colebrook_kernel
+        a = 2.0 / np.log(10.0)
+        ac = a * 2.51 / Re
+        log_ac = np.log(ac)
+        z = rough / (3.7 * d) / ac - log_ac
+        w = np.where(
+            z > 1.0,
+            z - np.log(np.where(z > 1.0, z, 1.0)),
+            np.where(z > -2.0, 1.0 + 0.5 * (z - 1.0) + (z - 1.0) ** 2 / 16.0, np.exp(z)),
+        )
+        r = z - w - np.log(w)
+        q = 2.0 * (1.0 + w) * (1.0 + w + 2.0 / 3.0 * r)
+        w = w * (1.0 + r / (1.0 + w) * (q - r) / (q - 2.0 * r))
+        x = -a * (log_ac + np.log(w))
+        f = 1.0 / (x * x)
+        dP_bar = f * (L_mm / 1000.0 / d) * (1000.0 * v * v) * 0.5 / 1e5
+        dP_bar = np.where(Re > 0, dP_bar, 0.0)
+
+    return valid, v, dP_bar
+
+
+class _MEPNetworkCache:
+    """Keeps the hydraulic inputs of the water pipes as a structure of
+    arrays, one row per pipe, so a whole network can be calculated in a
+    single vectorized pass without reading the properties of every pipe.
+    Rows are updated by _ArchWaterPipe.onChanged and dropped when their
+    pipe or document is deleted."""
+
+    CHUNK = 256
+
+    def __init__(self):
+        self.pipe_to_idx = {}
+        self.free = []
+        self.count = 0
+        self.flow_rates = np.zeros(self.CHUNK)
+        self.diameters = np.zeros(self.CHUNK)
+        self.lengths = np.zeros(self.CHUNK)
+        self.roughness = np.zeros(self.CHUNK)
+        self.observing = False
+
+    def index(self, obj):
+        """Returns the row of the given pipe, adding it if needed"""
+        key = (obj.Document.Name, obj.Name)
+        idx = self.pipe_to_idx.get(key)
+        if idx is not None:
+            return idx
+        if not self.observing:
+            FreeCAD.addDocumentObserver(self)
+            self.observing = True
+        if self.free:
+            idx = self.free.pop()
+        else:
+            idx = self.count
+            self.count += 1
+            if idx >= self.flow_rates.shape[0]:
+                size = self.flow_rates.shape[0] + self.CHUNK
+                self.flow_rates = np.resize(self.flow_rates, size)
+                self.diameters = np.resize(self.diameters, size)
+                self.lengths = np.resize(self.lengths, size)
+                self.roughness = np.resize(self.roughness, size)
+        self.pipe_to_idx[key] = idx
+        for prop in ("FlowRate", "Diameter", "Length", "RoughnessCoeff"):
+            self.update(obj, prop, idx)
+        return idx
+
+    def update(self, obj, prop, idx=None):
+        """Copies the given property of a pipe to its row"""
+        if idx is None:
+            idx = self.index(obj)
+        value = getattr(obj, prop, 0.0)
+        if prop == "FlowRate":
+            self.flow_rates[idx] = value
+        elif prop == "Diameter":
+            self.diameters[idx] = getattr(value, "Value", value)
+        elif prop == "Length":
+            self.lengths[idx] = getattr(value, "Value", value)
+        elif prop == "RoughnessCoeff":
+            self.roughness[idx] = value
+
+    def slotDeletedObject(self, obj):
+        idx = self.pipe_to_idx.pop((obj.Document.Name, obj.Name), None)
+        if idx is not None:
+            self.free.append(idx)
+
+    def slotDeletedDocument(self, doc):
+        for key in [key for key in self.pipe_to_idx if key[0] == doc.Name]:
+            self.free.append(self.pipe_to_idx.pop(key))
+
+
+_network_cache = _MEPNetworkCache()
+
+
+def _recompute_all(pipes):
+    """Calculates the hydraulics of the given water pipes in one vectorized
+    pass over their cached inputs, and writes Velocity and PressureLoss back.
+    Returns the (flow_rates, valid, pressure_losses) arrays, where valid is
+    False for the pipes left untouched because of a zero flow or diameter."""
+
+    indices = np.fromiter((_network_cache.index(p) for p in pipes), dtype=np.intp, count=len(pipes))
+    flow_rates = _network_cache.flow_rates[indices]
+    diameters = _network_cache.diameters[indices]
+    lengths = _network_cache.lengths[indices]
+    roughness = _network_cache.roughness[indices]
+    if _HAVE_NUMBA:
+        valid = (flow_rates != 0) & (diameters != 0)
+        velocities = np.empty(len(indices))
+        pressure_losses = np.empty(len(indices))
+        _colebrook_batch(flow_rates, diameters, lengths, roughness, velocities, pressure_losses)
+    else:
+        valid, velocities, pressure_losses = _batch_hydraulics(flow_rates, diameters, lengths, roughness)
+    for obj, ok, velocity, pressure_loss in zip(pipes, valid, velocities, pressure_losses):
+        if ok:
+            obj.Velocity = float(velocity)
+            obj.PressureLoss = float(pressure_loss)
+    return flow_rates, valid, pressure_losses
+
+
 class _ArchWaterPipe(ArchPipe._ArchPipe):
     """
     Extended water pipe object with hydraulic calculations and MEP properties.
@@ -62,123 +421,83 @@ class _ArchWaterPipe(ArchPipe._ArchPipe):
     """
 
     def __init__(self, obj):
+        self._recomputing = False
+        self._hydraulic_inputs = None
+        self._last_hydraulic = (None, None)
         ArchPipe._ArchPipe.__init__(self, obj)
         self.setMEPProperties(obj)
         obj.IfcType = "Pipe Segment"
 
     def setMEPProperties(self, obj):
         """Add MEP-specific properties to the water pipe"""
-        pl = obj.PropertiesList
-        
-        # Hydraulic Properties
-        if not "FlowRate" in pl:
-            obj.addProperty("App::PropertyFloat", "FlowRate", "MEP Hydraulics", 
-                          QT_TRANSLATE_NOOP("App::Property","Flow rate in liters/minute"), locked=True)
-            obj.FlowRate = 0.0
-            
-        if not "Pressure" in pl:
-            obj.addProperty("App::PropertyFloat", "Pressure", "MEP Hydraulics",
-                          QT_TRANSLATE_NOOP("App::Property","Pressure in bar"), locked=True)
-            obj.Pressure = 2.5  # Default water pressure
-            
-        if not "PressureLoss" in pl:
-            obj.addProperty("App::PropertyFloat", "PressureLoss", "MEP Hydraulics",
-                          QT_TRANSLATE_NOOP("App::Property","Calculated pressure loss in bar"), locked=True)
-            obj.setEditorMode("PressureLoss", 1)  # Read-only
-            
-        if not "Velocity" in pl:
-            obj.addProperty("App::PropertyFloat", "Velocity", "MEP Hydraulics",
-                          QT_TRANSLATE_NOOP("App::Property","Water velocity in m/s"), locked=True)
-            obj.setEditorMode("Velocity", 1)  # Read-only
-            
-        # MEP Classification
-        if not "SystemType" in pl:
-            obj.addProperty("App::PropertyEnumeration", "SystemType", "MEP System",
-                          QT_TRANSLATE_NOOP("App::Property","Type of water system"), locked=True)
-            obj.SystemType = ["Cold Water Supply", "Hot Water Supply", "Waste Water", "Rain Water", "Gas"]
-            obj.SystemType = "Cold Water Supply"
-            
-        if not "PipeMaterial" in pl:
-            obj.addProperty("App::PropertyEnumeration", "PipeMaterial", "MEP System",
-                          QT_TRANSLATE_NOOP("App::Property","Pipe material specification"), locked=True)
-            obj.PipeMaterial = ["Copper", "PVC", "PEX", "Steel", "Cast Iron", "HDPE"]
-            obj.PipeMaterial = "Copper"
-            
-        if not "RoughnessCoeff" in pl:
-            obj.addProperty("App::PropertyFloat", "RoughnessCoeff", "MEP System",
-                          QT_TRANSLATE_NOOP("App::Property","Pipe roughness coefficient"), locked=True)
-            obj.RoughnessCoeff = 0.0015  # Default for copper
-            
-        if not "InsulationThickness" in pl:
-            obj.addProperty("App::PropertyLength", "InsulationThickness", "MEP System",
-                          QT_TRANSLATE_NOOP("App::Property","Insulation thickness"), locked=True)
-            
-        # MEP Connections
-        if not "ConnectedFixtures" in pl:
-            obj.addProperty("App::PropertyLinkList", "ConnectedFixtures", "MEP Connections",
-                          QT_TRANSLATE_NOOP("App::Property","Connected sanitary fixtures"), locked=True)
-            
-        if not "ConnectedValves" in pl:
-            obj.addProperty("App::PropertyLinkList", "ConnectedValves", "MEP Connections",
-                          QT_TRANSLATE_NOOP("App::Property","Connected valves and fittings"), locked=True)
-
+        _add_properties(obj, _WATERPIPE_PROPS)
         self.Type = "WaterPipe"
 
     def onChanged(self, obj, prop):
         """Override onChanged to add hydraulic calculations"""
         ArchPipe._ArchPipe.onChanged(self, obj, prop)
-        
-        # Update material properties when material changes
-        if prop == "PipeMaterial":
-            self.updateMaterialProperties(obj)
-            
+
+        # Keep the network cache in sync with the hydraulic inputs
+        if prop in _HYDRAULIC_TRIGGERS and prop != "PipeMaterial":
+            _network_cache.update(obj, prop)
+
+        # Ignore the changes caused by our own updates below
+        if getattr(self, "_recomputing", False):
+            return
+
+        # The results were changed from outside (undo, scripts, batch
+        # calculation), so the last written values are not known anymore
+        if prop in ("Velocity", "PressureLoss"):
+            self._last_hydraulic = (None, None)
+            self._hydraulic_inputs = None
+
         # Recalculate hydraulics when relevant properties change
-        if prop in ["FlowRate", "Diameter", "Length", "PipeMaterial", "RoughnessCoeff"]:
-            self.calculateHydraulics(obj)
+        if prop in _HYDRAULIC_TRIGGERS:
+            self._recomputing = True
+            try:
+                # Update material properties when material changes
+                if prop == "PipeMaterial":
+                    self.updateMaterialProperties(obj)
+                self.calculateHydraulics(obj)
+            finally:
+                self._recomputing = False
 
     def updateMaterialProperties(self, obj):
         """Update roughness coefficient based on material"""
-        material_roughness = {
-            "Copper": 0.0015,
-            "PVC": 0.0001,
-            "PEX": 0.0001,
-            "Steel": 0.045,
-            "Cast Iron": 0.25,
-            "HDPE": 0.0001
-        }
-        obj.RoughnessCoeff = material_roughness.get(obj.PipeMaterial, 0.0015)
+        _set_if_diff(obj, "RoughnessCoeff", _PIPE_ROUGHNESS.get(obj.PipeMaterial, 0.0015))
 
     def calculateHydraulics(self, obj):
         """Calculate hydraulic parameters using Darcy-Weisbach equation"""
-        if obj.FlowRate == 0 or obj.Diameter.Value == 0:
+        flow = obj.FlowRate
+        d_mm = obj.Diameter.Value
+        if not (flow and d_mm):
+            self._hydraulic_inputs = None
             return
-            
-        # Convert units
-        flow_m3s = obj.FlowRate / 60000.0  # L/min to m³/s
-        diameter_m = obj.Diameter.Value / 1000.0  # mm to m
-        length_m = obj.Length.Value / 1000.0  # mm to m
-        
-        # Calculate cross-sectional area
-        area = math.pi * (diameter_m / 2) ** 2
-        
-        # Calculate velocity
-        velocity = flow_m3s / area if area > 0 else 0
-        obj.Velocity = velocity
-        
-        # Calculate pressure loss using Darcy-Weisbach equation
-        # ΔP = f * (L/D) * (ρ * v²) / 2
-        # Simplified friction factor for turbulent flow
-        reynolds = velocity * diameter_m / 1.004e-6  # Kinematic viscosity of water at 20°C
-        
-        if reynolds > 0:
-            # Colebrook-White approximation for friction factor
-            friction_factor = 0.25 / (math.log10(obj.RoughnessCoeff / (3.7 * diameter_m) + 5.74 / (reynolds ** 0.9))) ** 2
-            
-            # Pressure loss in Pascal, converted to bar
-            pressure_loss_pa = friction_factor * (length_m / diameter_m) * (1000 * velocity ** 2) / 2
-            obj.PressureLoss = pressure_loss_pa / 100000.0  # Pa to bar
-        else:
-            obj.PressureLoss = 0.0
+
+        # Nothing to do if the inputs didn't change since the last calculation
+        inputs = (flow, d_mm, obj.Length.Value, obj.RoughnessCoeff)
+        if inputs == getattr(self, "_hydraulic_inputs", None):
+            return
+        self._hydraulic_inputs = inputs
+
+        velocity, pressure_loss = _colebrook_kernel(*inputs)
+
+        # Only write the results that changed, to avoid useless notifications
+        # Only the written values are remembered, so small changes add up
+        # until they exceed the tolerance instead of being lost
+        last_velocity, last_pressure_loss = getattr(self, "_last_hydraulic", (None, None))
+        recomputing = getattr(self, "_recomputing", False)
+        self._recomputing = True
+        try:
+            if last_velocity is None or abs(velocity - last_velocity) > 1e-6:
+                obj.Velocity = velocity
+                last_velocity = velocity
+            if last_pressure_loss is None or abs(pressure_loss - last_pressure_loss) > 1e-8:
+                obj.PressureLoss = pressure_loss
+                last_pressure_loss = pressure_loss
+        finally:
+            self._recomputing = recomputing
+        self._last_hydraulic = (last_velocity, last_pressure_loss)
 
 
 class _ArchSanitaryFixture(ArchEquipment._ArchEquipment):
@@ -187,80 +506,37 @@ class _ArchSanitaryFixture(ArchEquipment._ArchEquipment):
     """
 
     def __init__(self, obj):
+        self._recomputing = False
         ArchEquipment._ArchEquipment.__init__(self, obj)
         self.setFixtureProperties(obj)
         obj.IfcType = "Sanitary Terminal"
 
     def setFixtureProperties(self, obj):
         """Add fixture-specific properties"""
-        pl = obj.PropertiesList
-        
-        # Fixture Classification
-        if not "FixtureType" in pl:
-            obj.addProperty("App::PropertyEnumeration", "FixtureType", "Fixture",
-                          QT_TRANSLATE_NOOP("App::Property","Type of sanitary fixture"), locked=True)
-            obj.FixtureType = ["Sink", "Wash Hand Basin", "Toilet Pan", "Urinal", "Bath", "Shower", "Bidet"]
-            obj.FixtureType = "Sink"
-            
-        if not "FixtureUnits" in pl:
-            obj.addProperty("App::PropertyFloat", "FixtureUnits", "Fixture",
-                          QT_TRANSLATE_NOOP("App::Property","Fixture units for load calculation"), locked=True)
-            obj.FixtureUnits = 1.0
-            
-        if not "FlowRate" in pl:
-            obj.addProperty("App::PropertyFloat", "FlowRate", "Fixture",
-                          QT_TRANSLATE_NOOP("App::Property","Required flow rate in L/min"), locked=True)
-            obj.FlowRate = 6.0  # Standard sink flow rate
-            
-        # Water Connections
-        if not "ColdWaterConnection" in pl:
-            obj.addProperty("App::PropertyLink", "ColdWaterConnection", "Connections",
-                          QT_TRANSLATE_NOOP("App::Property","Cold water supply connection"), locked=True)
-            
-        if not "HotWaterConnection" in pl:
-            obj.addProperty("App::PropertyLink", "HotWaterConnection", "Connections",
-                          QT_TRANSLATE_NOOP("App::Property","Hot water supply connection"), locked=True)
-            
-        if not "DrainConnection" in pl:
-            obj.addProperty("App::PropertyLink", "DrainConnection", "Connections",
-                          QT_TRANSLATE_NOOP("App::Property","Drain water connection"), locked=True)
-            
-        # Installation Properties
-        if not "WallMounted" in pl:
-            obj.addProperty("App::PropertyBool", "WallMounted", "Installation",
-                          QT_TRANSLATE_NOOP("App::Property","Whether fixture is wall mounted"), locked=True)
-            obj.WallMounted = True
-            
-        if not "InstallationHeight" in pl:
-            obj.addProperty("App::PropertyLength", "InstallationHeight", "Installation",
-                          QT_TRANSLATE_NOOP("App::Property","Installation height from floor"), locked=True)
-            obj.InstallationHeight = 850  # Standard height in mm
-
+        _add_properties(obj, _FIXTURE_PROPS)
         self.Type = "SanitaryFixture"
 
     def onChanged(self, obj, prop):
         """Update fixture properties based on type"""
         ArchEquipment._ArchEquipment.onChanged(self, obj, prop)
-        
+
+        # Ignore the changes caused by our own updates below
+        if getattr(self, "_recomputing", False):
+            return
+
         if prop == "FixtureType":
-            self.updateFixtureDefaults(obj)
+            self._recomputing = True
+            try:
+                self.updateFixtureDefaults(obj)
+            finally:
+                self._recomputing = False
 
     def updateFixtureDefaults(self, obj):
         """Update default values based on fixture type"""
-        fixture_defaults = {
-            "Sink": {"FlowRate": 6.0, "FixtureUnits": 1.5, "InstallationHeight": 850},
-            "Wash Hand Basin": {"FlowRate": 4.0, "FixtureUnits": 1.0, "InstallationHeight": 800},
-            "Toilet Pan": {"FlowRate": 0.0, "FixtureUnits": 4.0, "InstallationHeight": 400},
-            "Urinal": {"FlowRate": 0.0, "FixtureUnits": 2.0, "InstallationHeight": 600},
-            "Bath": {"FlowRate": 12.0, "FixtureUnits": 3.0, "InstallationHeight": 0},
-            "Shower": {"FlowRate": 9.0, "FixtureUnits": 2.0, "InstallationHeight": 2100},
-            "Bidet": {"FlowRate": 4.0, "FixtureUnits": 1.0, "InstallationHeight": 400}
-        }
-        
-        defaults = fixture_defaults.get(obj.FixtureType, {})
-        obj.FlowRate = defaults.get("FlowRate", 6.0)
-        obj.FixtureUnits = defaults.get("FixtureUnits", 1.0)
-        obj.InstallationHeight = defaults.get("InstallationHeight", 850)
+        defaults = _FIXTURE_DEFAULTS.get(obj.FixtureType, {})
+        _set_if_diff(obj, "FlowRate", defaults.get("FlowRate", 6.0))
+        _set_if_diff(obj, "FixtureUnits", defaults.get("FixtureUnits", 1.0))
+        _set_if_diff(obj, "InstallationHeight", defaults.get("InstallationHeight", 850))
 
 
 class _ArchValve(ArchComponent.Component):
@@ -269,57 +545,31 @@ class _ArchValve(ArchComponent.Component):
     """
 
     def __init__(self, obj):
+        self._geom_cache = (None, None)
         ArchComponent.Component.__init__(self, obj)
         self.setValveProperties(obj)
         obj.IfcType = "Valve"
 
+    @classmethod
+    def _templates(cls):
+        """Returns the valve shapes for a unit diameter, built only once:
+        the plain body, and the body with the handle of manual valves"""
+        if not hasattr(cls, "_unit_body"):
+            import Part
+            # Create a cylinder for valve body
+            height = 1.5
+            body = Part.makeCylinder(0.5, height)
+            # Add simple handle for manual valves. The handle only rests on
+            # top of the body, so a compound is enough, no need for a fusion
+            handle = Part.makeBox(0.3, 2.0, 0.2)
+            handle.translate(FreeCAD.Vector(-0.15, -1.0, height))
+            cls._unit_body = body
+            cls._unit_manual = Part.makeCompound([body, handle])
+        return cls._unit_body, cls._unit_manual
+
     def setValveProperties(self, obj):
         """Add valve-specific properties"""
-        pl = obj.PropertiesList
-        
-        # Valve Classification
-        if not "ValveType" in pl:
-            obj.addProperty("App::PropertyEnumeration", "ValveType", "Valve",
-                          QT_TRANSLATE_NOOP("App::Property","Type of valve"), locked=True)
-            obj.ValveType = ["Faucet", "Stop Cock", "Check Valve", "Pressure Relief", "Mixing Valve", "Gas Tap", "Isolating"]
-            obj.ValveType = "Faucet"
-            
-        if not "NominalDiameter" in pl:
-            obj.addProperty("App::PropertyLength", "NominalDiameter", "Valve",
-                          QT_TRANSLATE_NOOP("App::Property","Nominal diameter of valve"), locked=True)
-            obj.NominalDiameter = 15  # 15mm standard
-            
-        if not "WorkingPressure" in pl:
-            obj.addProperty("App::PropertyFloat", "WorkingPressure", "Valve",
-                          QT_TRANSLATE_NOOP("App::Property","Maximum working pressure in bar"), locked=True)
-            obj.WorkingPressure = 10.0
-            
-        if not "FlowCoefficient" in pl:
-            obj.addProperty("App::PropertyFloat", "FlowCoefficient", "Valve",
-                          QT_TRANSLATE_NOOP("App::Property","Valve flow coefficient (Kv)"), locked=True)
-            obj.FlowCoefficient = 1.0
-            
-        # Control Properties  
-        if not "IsMotorized" in pl:
-            obj.addProperty("App::PropertyBool", "IsMotorized", "Control",
-                          QT_TRANSLATE_NOOP("App::Property","Whether valve is motorized"), locked=True)
-            obj.IsMotorized = False
-            
-        if not "ControlSignal" in pl:
-            obj.addProperty("App::PropertyEnumeration", "ControlSignal", "Control",
-                          QT_TRANSLATE_NOOP("App::Property","Control signal type"), locked=True)
-            obj.ControlSignal = ["Manual", "24V DC", "230V AC", "0-10V", "4-20mA"]
-            obj.ControlSignal = "Manual"
-            
-        # Connection Properties
-        if not "InletConnection" in pl:
-            obj.addProperty("App::PropertyLink", "InletConnection", "Connections",
-                          QT_TRANSLATE_NOOP("App::Property","Inlet pipe connection"), locked=True)
-            
-        if not "OutletConnection" in pl:
-            obj.addProperty("App::PropertyLink", "OutletConnection", "Connections",
-                          QT_TRANSLATE_NOOP("App::Property","Outlet pipe connection"), locked=True)
-
+        _add_properties(obj, _VALVE_PROPS)
         self.Type = "Valve"
 
     def execute(self, obj):
@@ -329,20 +579,21 @@ class _ArchValve(ArchComponent.Component):
             
         # Create simple valve representation if no base shape
         if not obj.Base:
-            import Part
-            # Create a cylinder for valve body
-            diameter = obj.NominalDiameter.Value
-            height = diameter * 1.5
-            
-            valve_body = Part.makeCylinder(diameter/2, height)
-            
-            # Add simple handle for manual valves
-            if obj.ControlSignal == "Manual":
-                handle = Part.makeBox(diameter * 0.3, diameter * 2, diameter * 0.2)
-                handle.translate(FreeCAD.Vector(-diameter * 0.15, -diameter, height))
-                valve_body = valve_body.fuse(handle)
-            
-            obj.Shape = valve_body
+            # Reuse the last shape if the diameter and control type are the same
+            manual = obj.ControlSignal == "Manual"
+            key = (round(obj.NominalDiameter.Value, 3), manual)
+            cached_key, cached_shape = getattr(self, "_geom_cache", (None, None))
+            if key == cached_key:
+                obj.Shape = cached_shape.copy()
+                return
+
+            # Scale the unit valve template, in multiples of the diameter
+            body_template, manual_template = self._templates()
+            template = manual_template if manual else body_template
+            valve_body = template.scaled(obj.NominalDiameter.Value)
+
+            self._geom_cache = (key, valve_body)
+            obj.Shape = valve_body.copy()
         else:
             ArchComponent.Component.execute(self, obj)
 
@@ -365,16 +616,13 @@ class _ViewProviderWaterPipe:
     def updateSystemColor(self, obj):
         """Color code pipes by system type"""
         if FreeCAD.GuiUp:
-            color_map = {
-                "Cold Water Supply": (0.0, 0.0, 1.0),    # Blue
-                "Hot Water Supply": (1.0, 0.0, 0.0),     # Red  
-                "Waste Water": (0.5, 0.3, 0.1),          # Brown
-                "Rain Water": (0.0, 1.0, 1.0),           # Cyan
-                "Gas": (1.0, 1.0, 0.0)                   # Yellow
-            }
-            color = color_map.get(obj.SystemType, (0.7, 0.7, 0.7))  # Default gray
-            obj.ViewObject.LineColor = color
-            obj.ViewObject.ShapeColor = color
+            color = _SYSTEM_COLORS.get(obj.SystemType, _DEFAULT_COLOR)
+            vobj = obj.ViewObject
+            # Colors are stored as single precision floats, compare loosely
+            if any(abs(a - b) > 1e-4 for a, b in zip(vobj.LineColor, color)):
+                vobj.LineColor = color
+            if any(abs(a - b) > 1e-4 for a, b in zip(vobj.ShapeColor, color)):
+                vobj.ShapeColor = color
 
 
 class _ViewProviderSanitaryFixture:
@@ -34,6 +34,7 @@ from bimtests.TestArchPanel import TestArchPanel
 from bimtests.TestArchWindow import TestArchWindow
 from bimtests.TestArchStairs import TestArchStairs
 from bimtests.TestArchPipe import TestArchPipe
+from bimtests.TestArchMEP import TestArchMEP
 from bimtests.TestArchCurtainWall import TestArchCurtainWall
 from bimtests.TestArchProfile import TestArchProfile
 from bimtests.TestArchProject import TestArchProject
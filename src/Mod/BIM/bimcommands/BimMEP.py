@@ -32,6 +32,21 @@ translate = FreeCAD.Qt.translate
 
 PARAMS = FreeCAD.ParamGet("User parameter:BaseApp/Preferences/Mod/BIM")
 
+_active_cache = [None, False]  # [active window, has a 3D view]
+
+
+def _mep_is_active():
+    """Returns True if the active window is a 3D view. The result is cached
+    per window, since a given window never gains or loses its scene graph.
+    The window object itself is kept in the cache, so its identity cannot
+    be reused by the wrapper of another view"""
+
+    w = FreeCADGui.getMainWindow().getActiveWindow()
+    if _active_cache[0] is not w:
+        _active_cache[0] = w
+        _active_cache[1] = hasattr(w, "getSceneGraph")
+    return _active_cache[1]
+
 
 class Arch_WaterPipe:
     """Command to create water pipes with MEP properties"""
@@ -43,20 +58,23 @@ class Arch_WaterPipe:
                 'ToolTip': QT_TRANSLATE_NOOP("Arch_WaterPipe", "Creates a water pipe with hydraulic calculations")}
 
     def IsActive(self):
-        v = hasattr(FreeCADGui.getMainWindow().getActiveWindow(), "getSceneGraph")
-        return v
+        return _mep_is_active()
 
     def Activated(self):
         s = FreeCADGui.Selection.getSelection()
         if s:
+            import Arch
+            import Draft
+            FreeCADGui.addModule("Arch")
+            FreeCADGui.addModule("Draft")
             for obj in s:
                 if hasattr(obj, 'Shape'):
                     if len(obj.Shape.Wires) == 1:
                         FreeCAD.ActiveDocument.openTransaction(translate("Arch", "Create Water Pipe"))
-                        FreeCADGui.addModule("Arch")
-                        FreeCADGui.addModule("Draft")
-                        FreeCADGui.doCommand(f"obj = Arch.makeWaterPipe(FreeCAD.ActiveDocument.{obj.Name})")
-                        FreeCADGui.doCommand("Draft.autogroup(obj)")
+                        Draft.autogroup(Arch.makeWaterPipe(obj))
+                        # Only record the equivalent commands in the macro
+                        FreeCADGui.doCommandSkip(f"obj = Arch.makeWaterPipe(FreeCAD.ActiveDocument.{obj.Name})")
+                        FreeCADGui.doCommandSkip("Draft.autogroup(obj)")
                         FreeCAD.ActiveDocument.commitTransaction()
         else:
             FreeCAD.ActiveDocument.openTransaction(translate("Arch", "Create Water Pipe"))
@@ -78,19 +96,22 @@ class Arch_SanitaryFixture:
                 'ToolTip': QT_TRANSLATE_NOOP("Arch_SanitaryFixture", "Creates a sanitary fixture (sink, toilet, etc.)")}
 
     def IsActive(self):
-        v = hasattr(FreeCADGui.getMainWindow().getActiveWindow(), "getSceneGraph")
-        return v
+        return _mep_is_active()
 
     def Activated(self):
         s = FreeCADGui.Selection.getSelection()
         if s:
+            import Arch
+            import Draft
+            FreeCADGui.addModule("Arch")
+            FreeCADGui.addModule("Draft")
             for obj in s:
                 if hasattr(obj, 'Shape'):
                     FreeCAD.ActiveDocument.openTransaction(translate("Arch", "Create Sanitary Fixture"))
-                    FreeCADGui.addModule("Arch")
-                    FreeCADGui.addModule("Draft")
-                    FreeCADGui.doCommand(f"obj = Arch.makeSanitaryFixture(FreeCAD.ActiveDocument.{obj.Name})")
-                    FreeCADGui.doCommand("Draft.autogroup(obj)")
+                    Draft.autogroup(Arch.makeSanitaryFixture(obj))
+                    # Only record the equivalent commands in the macro
+                    FreeCADGui.doCommandSkip(f"obj = Arch.makeSanitaryFixture(FreeCAD.ActiveDocument.{obj.Name})")
+                    FreeCADGui.doCommandSkip("Draft.autogroup(obj)")
                     FreeCAD.ActiveDocument.commitTransaction()
         else:
             FreeCAD.ActiveDocument.openTransaction(translate("Arch", "Create Sanitary Fixture"))
@@ -112,19 +133,22 @@ class Arch_Valve:
                 'ToolTip': QT_TRANSLATE_NOOP("Arch_Valve", "Creates a valve, faucet or tap")}
 
     def IsActive(self):
-        v = hasattr(FreeCADGui.getMainWindow().getActiveWindow(), "getSceneGraph")
-        return v
+        return _mep_is_active()
 
     def Activated(self):
         s = FreeCADGui.Selection.getSelection()
         if s:
+            import Arch
+            import Draft
+            FreeCADGui.addModule("Arch")
+            FreeCADGui.addModule("Draft")
             for obj in s:
                 if hasattr(obj, 'Shape'):
                     FreeCAD.ActiveDocument.openTransaction(translate("Arch", "Create Valve"))
-                    FreeCADGui.addModule("Arch")
-                    FreeCADGui.addModule("Draft")
-                    FreeCADGui.doCommand(f"obj = Arch.makeValve(FreeCAD.ActiveDocument.{obj.Name})")
-                    FreeCADGui.doCommand("Draft.autogroup(obj)")
+                    Draft.autogroup(Arch.makeValve(obj))
+                    # Only record the equivalent commands in the macro
+                    FreeCADGui.doCommandSkip(f"obj = Arch.makeValve(FreeCAD.ActiveDocument.{obj.Name})")
+                    FreeCADGui.doCommandSkip("Draft.autogroup(obj)")
                     FreeCAD.ActiveDocument.commitTransaction()
         else:
             FreeCAD.ActiveDocument.openTransaction(translate("Arch", "Create Valve"))
@@ -146,8 +170,7 @@ class Arch_MEPNetwork:
                 'ToolTip': QT_TRANSLATE_NOOP("Arch_MEPNetwork", "Creates an MEP network from selected pipes and fixtures")}
 
     def IsActive(self):
-        v = hasattr(FreeCADGui.getMainWindow().getActiveWindow(), "getSceneGraph")
-        return v
+        return _mep_is_active()
 
     def Activated(self):
         import Draft
@@ -161,38 +184,38 @@ class Arch_MEPNetwork:
         pipes = []
         fixtures = []
         valves = []
-        
+        get_type = Draft.getType
+
         for obj in s:
-            obj_type = getattr(obj.Proxy, 'Type', None) if hasattr(obj, 'Proxy') else None
-            if obj_type == "WaterPipe" or Draft.getType(obj) == "Pipe":
+            # Check the cheap proxy type first, Draft.getType only on a miss
+            proxy = getattr(obj, 'Proxy', None)
+            obj_type = getattr(proxy, 'Type', None) if proxy is not None else None
+            if obj_type == "WaterPipe":
                 pipes.append(obj)
             elif obj_type == "SanitaryFixture":
                 fixtures.append(obj)
             elif obj_type == "Valve":
                 valves.append(obj)
+            elif get_type(obj) == "Pipe":
+                pipes.append(obj)
         
         if not (pipes or fixtures or valves):
             FreeCAD.Console.PrintError(translate("Arch", "No valid MEP objects selected") + "\n")
             return
             
+        import Arch
         FreeCAD.ActiveDocument.openTransaction(translate("Arch", "Create MEP Network"))
         FreeCADGui.addModule("Arch")
-        
-        # Build command string
+        Arch.makeMEPNetwork(pipes=pipes, fixtures=fixtures, valves=valves)
+
+        # Only record the equivalent command in the macro
         cmd_parts = []
-        if pipes:
-            pipe_names = "[" + ",".join([f"FreeCAD.ActiveDocument.{obj.Name}" for obj in pipes]) + "]"
-            cmd_parts.append(f"pipes={pipe_names}")
-        if fixtures:
-            fixture_names = "[" + ",".join([f"FreeCAD.ActiveDocument.{obj.Name}" for obj in fixtures]) + "]"
-            cmd_parts.append(f"fixtures={fixture_names}")
-        if valves:
-            valve_names = "[" + ",".join([f"FreeCAD.ActiveDocument.{obj.Name}" for obj in valves]) + "]"
-            cmd_parts.append(f"valves={valve_names}")
-            
-        cmd = f"obj = Arch.makeMEPNetwork({','.join(cmd_parts)})"
-        FreeCADGui.doCommand(cmd)
-        
+        for arg, objs in (("pipes", pipes), ("fixtures", fixtures), ("valves", valves)):
+            if objs:
+                names = ",".join(f"FreeCAD.ActiveDocument.{obj.Name}" for obj in objs)
+                cmd_parts.append(f"{arg}=[{names}]")
+        FreeCADGui.doCommandSkip(f"obj = Arch.makeMEPNetwork({','.join(cmd_parts)})")
+
         FreeCAD.ActiveDocument.commitTransaction()
         FreeCAD.ActiveDocument.recompute()
 
@@ -207,11 +230,9 @@ class Arch_MEPHydraulicCalculation:
                 'ToolTip': QT_TRANSLATE_NOOP("Arch_MEPHydraulicCalculation", "Performs hydraulic calculations on selected water pipes")}
 
     def IsActive(self):
-        v = hasattr(FreeCADGui.getMainWindow().getActiveWindow(), "getSceneGraph")
-        return v
+        return _mep_is_active()
 
     def Activated(self):
-        import Draft
         s = FreeCADGui.Selection.getSelection()
         
         if not s:
@@ -219,20 +240,25 @@ class Arch_MEPHydraulicCalculation:
             return
             
         calculated_pipes = []
-        total_flow = 0.0
-        total_pressure_loss = 0.0
-        
+
         for obj in s:
-            obj_type = getattr(obj.Proxy, 'Type', None) if hasattr(obj, 'Proxy') else None
+            proxy = getattr(obj, 'Proxy', None)
+            obj_type = getattr(proxy, 'Type', None) if proxy is not None else None
             if obj_type == "WaterPipe":
-                # Force recalculation
-                if hasattr(obj.Proxy, 'calculateHydraulics'):
-                    obj.Proxy.calculateHydraulics(obj)
+                if hasattr(proxy, 'calculateHydraulics'):
                     calculated_pipes.append(obj)
-                    total_flow += obj.FlowRate
-                    total_pressure_loss += obj.PressureLoss
-        
+
         if calculated_pipes:
+            # Force recalculation of the whole selection in one vectorized pass
+            import ArchMEP
+            flow_rates, valid, pressure_losses = ArchMEP._recompute_all(calculated_pipes)
+
+            # Totals come from the arrays, only skipped pipes need a property read
+            total_flow = float(flow_rates.sum())
+            total_pressure_loss = float(pressure_losses[valid].sum()) + sum(
+                obj.PressureLoss for obj, ok in zip(calculated_pipes, valid) if not ok
+            )
+
             FreeCAD.Console.PrintMessage(f"Hydraulic calculation completed for {len(calculated_pipes)} pipes\n")
             FreeCAD.Console.PrintMessage(f"Total flow rate: {total_flow:.2f} L/min\n")
             FreeCAD.Console.PrintMessage(f"Total pressure loss: {total_pressure_loss:.4f} bar\n")
@@ -251,8 +277,7 @@ class Arch_MEPGroupCommand:
                 'ToolTip': QT_TRANSLATE_NOOP("Arch_MEPTools", 'MEP (Mechanical, Electrical, Plumbing) tools')}
 
     def IsActive(self):
-        v = hasattr(FreeCADGui.getMainWindow().getActiveWindow(), "getSceneGraph")
-        return v
+        return _mep_is_active()
 
 
 # Register commands
@@ -0,0 +1,241 @@
+# SPDX-License-Identifier: LGPL-2.1-or-later
+
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2026 MeliCAD MEP Extension                             *
+# *                                                                         *
+# *   This file is part of FreeCAD.                                         *
+# *                                                                         *
+# *   FreeCAD is free software: you can redistribute it and/or modify it    *
+# *   under the terms of the GNU Lesser General Public License as           *
+# *   published by the Free Software Foundation, either version 2.1 of the  *
+# *   License, or (at your option) any later version.                       *
+# *                                                                         *
+# *   FreeCAD is distributed in the hope that it will be useful, but        *
+# *   WITHOUT ANY WARRANTY; without even the implied warranty of            *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU      *
+# *   Lesser General Public License for more details.                       *
+# *                                                                         *
+# *   You should have received a copy of the GNU Lesser General Public      *
+# *   License along with FreeCAD. If not, see                               *
+# *   <https://www.gnu.org/licenses/>.                                      *
+# *                                                                         *
+# ***************************************************************************
+
+import math
+
+import numpy as np
+
+import FreeCAD
+import Arch
+import ArchMEP
+from bimtests import TestArchBase
+
+
+def _iterated_colebrook(reynolds, rel_rough):
+    """Friction factor from the Colebrook-White equation, solved by fixed-point iteration"""
+    x = 7.0  # 1/√f
+    for _ in range(200):
+        x = -2.0 * math.log10(rel_rough / 3.7 + 2.51 * x / reynolds)
+    return 1.0 / (x * x)
+
+
+def _inputs(reynolds, rel_rough, d_mm=50.0, L_mm=1000.0):
+    """Returns the (flow_lpm, d_mm, L_mm, rough) kernel inputs giving the
+    wanted Reynolds number and relative roughness"""
+    d = d_mm / 1000.0
+    velocity = reynolds * 1.004e-6 / d
+    flow_lpm = velocity * math.pi * (d / 2) ** 2 * 60000.0
+    # the kernel takes the roughness relative to the diameter in meters
+    return flow_lpm, d_mm, L_mm, rel_rough * d
+
+
+class TestArchMEP(TestArchBase.TestArchBase):
+
+    REYNOLDS = (4.0e3, 1.0e4, 1.0e5, 1.0e6, 1.0e7)
+    ROUGHNESS = (0.0, 1.0e-6, 1.0e-4, 1.0e-3, 1.0e-2, 5.0e-2)
+
+    def _kernels(self):
+        kernels = [ArchMEP._colebrook_kernel]
+        if hasattr(ArchMEP._colebrook_kernel, "py_func"):
+            kernels.append(ArchMEP._colebrook_kernel.py_func)
+        return kernels
+
+    def _scalar(self, flow_lpm, d_mm, L_mm, rough):
+        """Velocity and pressure loss of the scalar path, None if skipped"""
+        if not (flow_lpm and d_mm):
+            return None
+        return ArchMEP._colebrook_kernel(flow_lpm, d_mm, L_mm, rough)
+
+    def test_colebrookKernel(self):
+        """Test the friction factor of _colebrook_kernel against the iterated Colebrook solution."""
+        operation = "Testing _colebrook_kernel against the Colebrook-White equation"
+        self.printTestMessage(operation)
+
+        for kernel in self._kernels():
+            for reynolds in self.REYNOLDS:
+                for rel_rough in self.ROUGHNESS:
+                    flow_lpm, d_mm, L_mm, rough = _inputs(reynolds, rel_rough)
+                    velocity, pressure_loss = kernel(flow_lpm, d_mm, L_mm, rough)
+                    d = d_mm / 1000.0
+                    friction = pressure_loss * 1e5 / ((L_mm / 1000.0 / d) * 500.0 * velocity * velocity)
+                    expected = _iterated_colebrook(reynolds, rel_rough)
+                    self.assertLess(abs(friction / expected - 1.0), 1e-6,
+                                    f"Friction factor is wrong for Re={reynolds}, k/D={rel_rough}.")
+
+    def test_batchHydraulics(self):
+        """Test that the batch calculations match the scalar path."""
+        operation = "Testing _batch_hydraulics and _colebrook_batch against _colebrook_kernel"
+        self.printTestMessage(operation)
+
+        rows = [_inputs(reynolds, rel_rough) for reynolds in self.REYNOLDS for rel_rough in self.ROUGHNESS]
+        rows += [(0.0, 50.0, 1000.0, 0.0015), (-12.0, 50.0, 1000.0, 0.0015), (12.0, 0.0, 1000.0, 0.0015)]
+        flow, d, L, rough = (np.array(col, dtype=float) for col in zip(*rows))
+
+        valid, velocities, pressure_losses = ArchMEP._batch_hydraulics(flow, d, L, rough)
+        results = [(valid, velocities, pressure_losses)]
+        if ArchMEP._HAVE_NUMBA:
+            v_out = np.empty(len(rows))
+            dp_out = np.empty(len(rows))
+            ArchMEP._colebrook_batch(flow, d, L, rough, v_out, dp_out)
+            results.append((valid, v_out, dp_out))
+
+        for valid, velocities, pressure_losses in results:
+            for row, ok, velocity, pressure_loss in zip(rows, valid, velocities, pressure_losses):
+                expected = self._scalar(*row)
+                self.assertEqual(bool(ok), expected is not None, f"Wrong validity for {row}.")
+                if expected is None:
+                    continue
+                self.assertAlmostEqual(velocity, expected[0], delta=1e-12 * abs(expected[0]))
+                self.assertAlmostEqual(pressure_loss, expected[1], delta=1e-12 * abs(expected[1]))
+
+    def test_recomputeAll(self):
+        """Test that _recompute_all writes the same results as the scalar path."""
+        operation = "Testing _recompute_all"
+        self.printTestMessage(operation)
+
+        values = [(12.0, 20.0), (60.0, 32.0), (0.0, 20.0), (-12.0, 20.0)]
+        pipes = []
+        for flow, diameter in values:
+            pipe = Arch.makeWaterPipe(diameter=diameter, length=2000)
+            pipe.FlowRate = flow
+            pipes.append(pipe)
+        self.document.recompute()
+        pipes[2].PressureLoss = 0.5  # must be left untouched
+
+        flow_rates, valid, pressure_losses = ArchMEP._recompute_all(pipes)
+        self.assertEqual(list(flow_rates), [flow for flow, _ in values])
+        for pipe, ok, pressure_loss in zip(pipes, valid, pressure_losses):
+            expected = self._scalar(pipe.FlowRate, pipe.Diameter.Value,
+                                    pipe.Length.Value, pipe.RoughnessCoeff)
+            self.assertEqual(bool(ok), expected is not None)
+            if expected is None:
+                self.assertEqual(pipe.PressureLoss, 0.5, "Skipped pipe was modified.")
+                continue
+            self.assertAlmostEqual(pipe.Velocity, expected[0], delta=1e-12 * abs(expected[0]))
+            self.assertAlmostEqual(pipe.PressureLoss, expected[1], delta=1e-12 * abs(expected[1]) + 1e-15)
+            self.assertAlmostEqual(pressure_loss, expected[1], delta=1e-12 * abs(expected[1]) + 1e-15)
+
+    def test_hydraulicsAfterUndo(self):
+        """Test that setting the same flow rate again after an undo recalculates the pipe."""
+        operation = "Testing calculateHydraulics after undo"
+        self.printTestMessage(operation)
+
+        self.document.UndoMode = 1
+        pipe = Arch.makeWaterPipe(diameter=20, length=2000)
+        self.document.recompute()
+        expected = self._scalar(12.0, pipe.Diameter.Value, pipe.Length.Value, pipe.RoughnessCoeff)
+
+        self.document.openTransaction("Set flow rate")
+        pipe.FlowRate = 12.0
+        self.document.commitTransaction()
+        self.assertAlmostEqual(pipe.Velocity, expected[0], delta=1e-12 * expected[0])
+
+        self.document.undo()
+        self.assertEqual(pipe.FlowRate, 0.0)
+        self.assertEqual(pipe.Velocity, 0.0)
+        self.assertEqual(pipe.PressureLoss, 0.0)
+
+        self.document.openTransaction("Set flow rate again")
+        pipe.FlowRate = 12.0
+        self.document.commitTransaction()
+        self.assertAlmostEqual(pipe.Velocity, expected[0], delta=1e-12 * expected[0],
+                               msg="Velocity was not recalculated after undo.")
+        self.assertAlmostEqual(pipe.PressureLoss, expected[1], delta=1e-12 * expected[1],
+                               msg="PressureLoss was not recalculated after undo.")
+
+    def _assertRow(self, pipe):
+        cache = ArchMEP._network_cache
+        idx = cache.pipe_to_idx[(pipe.Document.Name, pipe.Name)]
+        self.assertEqual(cache.flow_rates[idx], pipe.FlowRate)
+        self.assertEqual(cache.diameters[idx], pipe.Diameter.Value)
+        self.assertEqual(cache.lengths[idx], pipe.Length.Value)
+        self.assertEqual(cache.roughness[idx], pipe.RoughnessCoeff)
+
+    def test_networkCacheEdits(self):
+        """Test that the network cache follows the edits of the hydraulic inputs."""
+        operation = "Testing _MEPNetworkCache updates"
+        self.printTestMessage(operation)
+
+        pipe = Arch.makeWaterPipe(diameter=20, length=2000)
+        pipe.FlowRate = 12.0
+        self._assertRow(pipe)
+        pipe.Diameter = 25
+        self._assertRow(pipe)
+        pipe.Length = 3500
+        self._assertRow(pipe)
+        pipe.RoughnessCoeff = 0.002
+        self._assertRow(pipe)
+        # RoughnessCoeff is changed by updateMaterialProperties while _recomputing is set
+        pipe.PipeMaterial = "Steel"
+        self.assertEqual(pipe.RoughnessCoeff, 0.045)
+        self._assertRow(pipe)
+
+    def test_networkCacheDeleteUndo(self):
+        """Test that deleting a pipe frees its row, and undoing re-reads it."""
+        operation = "Testing _MEPNetworkCache with deletion and undo"
+        self.printTestMessage(operation)
+
+        cache = ArchMEP._network_cache
+        self.document.UndoMode = 1
+        pipe = Arch.makeWaterPipe(diameter=20, length=2000)
+        pipe.FlowRate = 12.0
+        name = pipe.Name
+        key = (self.document.Name, name)
+        self.assertIn(key, cache.pipe_to_idx)
+        free = len(cache.free)
+
+        self.document.openTransaction("Delete pipe")
+        self.document.removeObject(name)
+        self.document.commitTransaction()
+        self.assertNotIn(key, cache.pipe_to_idx, "Row of deleted pipe was not freed.")
+        self.assertEqual(len(cache.free), free + 1)
+
+        # Another pipe may take the freed row in the meantime
+        other = Arch.makeWaterPipe(diameter=40, length=500)
+        other.FlowRate = 30.0
+
+        self.document.undo()
+        pipe = self.document.getObject(name)
+        self.assertIsNotNone(pipe, "Undo did not restore the pipe.")
+        ArchMEP._recompute_all([pipe, other])
+        self._assertRow(pipe)
+        self._assertRow(other)
+
+    def test_networkCacheCloseDocument(self):
+        """Test that closing a document frees its rows."""
+        operation = "Testing _MEPNetworkCache with a closed document"
+        self.printTestMessage(operation)
+
+        cache = ArchMEP._network_cache
+        doc = FreeCAD.newDocument("TestArchMEPClose")
+        try:
+            pipe = Arch.makeWaterPipe(diameter=20, length=2000)
+            pipe.FlowRate = 12.0
+            self.assertIn((doc.Name, pipe.Name), cache.pipe_to_idx)
+        finally:
+            docname = doc.Name
+            FreeCAD.closeDocument(docname)
+            FreeCAD.setActiveDocument(self.document.Name)
+        self.assertFalse([key for key in cache.pipe_to_idx if key[0] == docname],
+                         "Rows of the closed document were not freed.")